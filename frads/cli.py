@@ -376,12 +376,9 @@ def genmtx_sky(sender: Sender, args: argparse.Namespace):
     outpath = args.output[0]
     if sender.form == "v":
         outpath.mkdir(exist_ok=True)
-    res = matrix.rfluxmtx(
+    matrix.rfluxmtx(
         sender=sender, receiver=receiver, env=env, opt=args.option, out=outpath
     )
-    if (outpath is not None) and (sender.form != "v"):
-        with open(outpath, "wb") as wtr:
-            wtr.write(res)
 
 
 def genmtx_sun(sender: Sender, env, args: argparse.Namespace) -> None:
@@ -424,7 +421,7 @@ def genmtx_surface(sender: matrix.Sender, env, args: argparse.Namespace) -> None
     for path in args.rsurface:
         rcvr_prims.extend(utils.unpack_primitives(path))
     modifiers = set([prim.modifier for prim in rcvr_prims])
-    receiver = Receiver(receiver="", basis=args.receiver_basis, modifier="")
+    receivers = [Receiver(receiver="", basis=args.receiver_basis, modifier="")]
     for mod, op in zip(modifiers, args.output):
         _receiver = [
             prim
@@ -436,14 +433,17 @@ def genmtx_surface(sender: matrix.Sender, env, args: argparse.Namespace) -> None
                 _outpath = os.path.join(op, "%04d.hdr")
             else:
                 _outpath = op
-            receiver += matrix.surface_as_receiver(
-                prim_list=_receiver,
-                basis=args.receiver_basis,
-                offset=args.receiver_offset,
-                left=None,
-                source="glow",
-                out=_outpath,
+            receivers.append(
+                matrix.surface_as_receiver(
+                    prim_list=_receiver,
+                    basis=args.receiver_basis,
+                    offset=args.receiver_offset,
+                    left=None,
+                    source="glow",
+                    out=_outpath,
+                )
             )
+    receiver = matrix.merge_receivers(receivers)
     matrix.rfluxmtx(
         sender=sender, receiver=receiver, env=env, opt=args.option, out=None
     )
@@ -461,7 +461,9 @@ def genmtx_ncp(args: argparse.Namespace):
     else:
         ports = ncp.gen_port_prims_from_window_ncp(wprims, nprims)
     nmodel = ncp.Model(wprims, ports, env, args.sbasis, args.rbasis)
-    ncp.gen_ncp_mtx(nmodel, args.output, args.opt, args.solar)
+    ncp.gen_ncp_mtx(
+        nmodel, args.output, args.opt, solar=args.solar, ncp_prims=nprims
+    )
 
 
 def genmtx():
@@ -115,34 +115,21 @@ class Vector:
             the rotated point
 
         """
-        cosa = math.cos(theta)
-        sina = math.sin(theta)
-
-        row1 = [
-            (vector.x * vector.x) + ((1 - (vector.x * vector.x)) * cosa),
-            (vector.x * vector.y * (1 - cosa)) - (vector.z * sina),
-            (vector.x * vector.z * (1 - cosa)) + (vector.y * sina),
-            0.0,
-        ]
-        row2 = [
-            (vector.x * vector.y * (1 - cosa)) + (vector.z * sina),
-            (vector.y * vector.y) + ((1 - (vector.y * vector.y)) * cosa),
-            (vector.y * vector.z * (1 - cosa)) - (vector.x * sina),
-            0.0,
-        ]
-        row3 = [
-            (vector.x * vector.z * (1.0 - cosa)) - (vector.y * sina),
-            (vector.y * vector.z * (1.0 - cosa)) + (vector.x * sina),
-            (vector.z * vector.z) + ((1.0 - (vector.z * vector.z)) * cosa),
-            0.0,
-        ]
-
-        row4 = [0.0] * 4
-
-        rx = (self.x * row1[0]) + (self.y * row2[0]) + (self.z * row3[0]) + row4[0]
-        ry = (self.x * row1[1]) + (self.y * row2[1]) + (self.z * row3[1]) + row4[1]
-        rz = (self.x * row1[2]) + (self.y * row2[2]) + (self.z * row3[2]) + row4[2]
+        return self.transform(rotation_matrix(vector, theta))
 
+    def transform(self, matrix: Sequence[Sequence[float]]) -> Vector:
+        """Transform the point by a 3x3 matrix, as returned by rotation_matrix.
+
+        Args:
+            matrix: three rows of three floats
+        Returns:
+            the transformed point
+
+        """
+        row1, row2, row3 = matrix
+        rx = (self.x * row1[0]) + (self.y * row2[0]) + (self.z * row3[0])
+        ry = (self.x * row1[1]) + (self.y * row2[1]) + (self.z * row3[1])
+        rz = (self.x * row1[2]) + (self.y * row2[2]) + (self.z * row3[2])
         return Vector(rx, ry, rz)
 
     def to_sphr(self):
@@ -174,6 +161,36 @@ class Vector:
         return cls(xcoord, ycoord, zcoord)
 
 
+def rotation_matrix(vector: Vector, theta: float) -> List[List[float]]:
+    """Get the matrix that rotates points around the vector theta radians.
+
+    Args:
+        vector: rotation axis
+        theta: rotation radians
+    Returns:
+        three rows of three floats, to be used with Vector.transform
+
+    """
+    cosa = math.cos(theta)
+    sina = math.sin(theta)
+    row1 = [
+        (vector.x * vector.x) + ((1 - (vector.x * vector.x)) * cosa),
+        (vector.x * vector.y * (1 - cosa)) - (vector.z * sina),
+        (vector.x * vector.z * (1 - cosa)) + (vector.y * sina),
+    ]
+    row2 = [
+        (vector.x * vector.y * (1 - cosa)) + (vector.z * sina),
+        (vector.y * vector.y) + ((1 - (vector.y * vector.y)) * cosa),
+        (vector.y * vector.z * (1 - cosa)) - (vector.x * sina),
+    ]
+    row3 = [
+        (vector.x * vector.z * (1.0 - cosa)) - (vector.y * sina),
+        (vector.y * vector.z * (1.0 - cosa)) + (vector.x * sina),
+        (vector.z * vector.z) + ((1.0 - (vector.z * vector.z)) * cosa),
+    ]
+    return [row1, row2, row3]
+
+
 class Polygon:
     """3D polygon class."""
 
@@ -323,8 +340,9 @@ class Polygon:
         return cnt, index
 
     def rotate(self, vector, angle):
-        """."""
-        ro_pts = [v.rotate_3d(vector, angle) for v in self.vertices]
+        """Rotate the polygon around the vector angle radians."""
+        matrix = rotation_matrix(vector, angle)
+        ro_pts = [v.transform(matrix) for v in self.vertices]
         return Polygon(ro_pts)
 
     def move(self, vector):
@@ -420,6 +438,36 @@ def get_polygon_limits(polygon_list: Sequence[Polygon], offset=0.0):
     return xmin, xmax, ymin, ymax, zmin, zmax
 
 
+def min_bbox_rotation(points: Sequence[Vector]) -> float:
+    """Get the rotation around +Z that minimizes the XY bounding box area.
+
+    The minimum-area enclosing rectangle has one side collinear with an edge
+    of the convex hull (rotating calipers), so only the hull edge directions
+    need to be tested.
+
+    Args:
+        points: list of points
+
+    Returns:
+        Rotation angle in radians [0, pi/2), to be used with Polygon.rotate
+    """
+    flat = list({Vector(p.x, p.y, 0) for p in points})
+    hull = convexhull(flat, Vector(0, 0, 1)).vertices
+    min_area = math.inf
+    min_rad = 0.0
+    for pt1, pt2 in zip(hull, hull[1:] + hull[:1]):
+        rad = math.atan2(pt2.y - pt1.y, pt2.x - pt1.x) % (math.pi / 2)
+        cosa = math.cos(rad)
+        sina = math.sin(rad)
+        xs = [p.x * cosa + p.y * sina for p in hull]
+        ys = [p.y * cosa - p.x * sina for p in hull]
+        area = (max(xs) - min(xs)) * (max(ys) - min(ys))
+        if area < min_area:
+            min_area = area
+            min_rad = rad
+    return min_rad
+
+
 def getbbox(polygons: Sequence[Polygon], offset: float = 0.0):
     """Get a bounding box for a list of polygons.
 
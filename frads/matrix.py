@@ -1,19 +1,37 @@
 """
 This module contains routines to generate sender and receiver objects, generate
 matrices by calling either rfluxmtx or rcontrib.
+
+Temporary sender and receiver files are written to the directory set by the
+FRADS_TMPDIR environment variable, or /dev/shm when it is writable.
+Octrees are cached under $XDG_CACHE_HOME/frads/oct, set the FRADS_OCT_CACHE
+environment variable to 0 to turn the cache off.
 """
 
 from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from functools import partial
+import hashlib
+import importlib.util
 import logging
 import os
 from pathlib import Path
+import re
+import shutil
+import signal
 import subprocess as sp
 import tempfile as tf
+from threading import Thread
+from typing import IO
+from typing import Iterator
+from typing import List
 from typing import Optional
 from typing import Sequence
+from typing import Tuple
 from typing import Union
 
-from frads import sky
 from frads import geom
 from frads import utils
 from frads import parsers
@@ -21,9 +39,21 @@ from frads.types import Primitive
 from frads.types import Receiver
 from frads.types import Sender
 
+# numpy is imported where it is used, to keep this module quick to import.
+NUMPY_FOUND = importlib.util.find_spec("numpy") is not None
+
 
 logger = logging.getLogger("frads.matrix")
 
+OCT_CACHE_SIZE_CAP = 2**30
+
+# Inline commands and references to other files in a scene description
+OCT_EXTERNAL_REF = re.compile(rb"^\s*!|\b(?:instance|mesh)\b", re.MULTILINE)
+
+TMPDIR = os.environ.get("FRADS_TMPDIR") or (
+    "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+)
+
 
 def surface_as_sender(prim_list: list, basis: str, offset=None, left=None):
     """
@@ -45,6 +75,35 @@ def surface_as_sender(prim_list: list, basis: str, offset=None, left=None):
     return Sender("s", prim_str.encode(), None, None)
 
 
+@lru_cache(maxsize=128)
+def opt2args(opt: str) -> Tuple[str, ...]:
+    """
+    Split an option string into command line arguments.
+    Cached, as the same options are used for every matrix in a study.
+    """
+    return tuple(opt.split())
+
+
+@lru_cache(maxsize=128)
+def view_resolution(
+    view_opts: Tuple[str, ...], xres: int, yres: int
+) -> Tuple[int, int]:
+    """
+    Get the image resolution vwrays will use for a view.
+    Results are cached, as the same view is often used for many matrices.
+
+    Args:
+        view_opts: view options as command line arguments
+        xres, yres: requested image resolution
+    Returns:
+        The adjusted x and y resolution
+    """
+    res_cmd = ["vwrays", *view_opts, "-x", str(xres), "-y", str(yres), "-d"]
+    res_proc = sp.run(res_cmd, check=True, stdout=sp.PIPE, encoding="ascii")
+    res_eval = res_proc.stdout.split()
+    return int(res_eval[1]), int(res_eval[3])
+
+
 def view_as_sender(vu_dict: dict, ray_cnt: int, xres: int, yres: int) -> Sender:
     """
     Construct a sender from a view.
@@ -61,34 +120,138 @@ def view_as_sender(vu_dict: dict, ray_cnt: int, xres: int, yres: int) -> Sender:
     """
     if (xres is None) or (yres is None):
         raise ValueError("Need to specify resolution")
-    res_cmd = [
-        "vwrays",
-        *(utils.opt2list(vu_dict)),
-        "-x",
-        str(xres),
-        "-y",
-        str(yres),
-        "-d",
-    ]
-    res_proc = sp.run(res_cmd, check=True, stdout=sp.PIPE, encoding="ascii")
-    res_eval = res_proc.stdout.split()
-    new_xres, new_yres = int(res_eval[1]), int(res_eval[3])
-    if (new_xres != xres) and (new_yres != yres):
-        logger.info("Changed resolution to %s %s", new_xres, new_yres)
-    vwrays_cmd = ["vwrays", "-ff", "-x", str(new_xres), "-y", str(new_yres)]
     if ray_cnt > 1:
         vu_dict["c"] = ray_cnt
         vu_dict["pj"] = 0.7  # placeholder
     logger.debug("Ray count is %s", ray_cnt)
-    vwrays_cmd += utils.opt2list(vu_dict)
-    vwrays_proc = sp.run(vwrays_cmd, check=True, stdout=sp.PIPE)
+    view_opts = tuple(utils.opt2list(vu_dict))
+    new_xres, new_yres = view_resolution(view_opts, xres, yres)
+    if (new_xres != xres) and (new_yres != yres):
+        logger.info("Changed resolution to %s %s", new_xres, new_yres)
+    vwrays_cmd = ["vwrays", "-ff", "-x", str(new_xres), "-y", str(new_yres)]
+    vwrays_cmd += view_opts
+    pipeline: list = [tuple(vwrays_cmd)]
     if vu_dict["vt"] == "a":
-        flush_cmd = utils.flush_corner_rays_cmd(ray_cnt, xres)
-        flush_proc = sp.run(flush_cmd, input=vwrays_proc.stdout, stdout=sp.PIPE)
-        vrays = flush_proc.stdout
-    else:
-        vrays = vwrays_proc.stdout
-    return Sender("v", vrays, xres, yres)
+        if NUMPY_FOUND:
+            pipeline.append(partial(apply_circle_mask, xres=xres, ray_cnt=ray_cnt))
+        else:
+            pipeline.append(tuple(utils.flush_corner_rays_cmd(ray_cnt, xres)))
+    return Sender("v", tuple(pipeline), xres, yres)
+
+
+def apply_circle_mask(inp: IO[bytes], out: IO[bytes], xres: int, ray_cnt: int):
+    """
+    Flush the corner rays from a fisheye view, numpy version of
+    utils.flush_corner_rays_cmd.
+
+    Args:
+        inp: stream of rays as six float32 per ray
+        out: stream to write the cropped rays to
+        xres: resolution of the square image
+        ray_cnt: ray count
+    Returns:
+        None
+    """
+    import numpy as np
+
+    chunk_size = 6 * 4 * 2**16
+    recno = 0
+    while True:
+        chunk = inp.read(chunk_size)
+        if not chunk:
+            break
+        rays = np.frombuffer(chunk, dtype=np.float32).reshape(-1, 6).copy()
+        pn = np.arange(recno, recno + len(rays)) / ray_cnt + 0.5
+        xpos = np.modf(pn / xres)[0]
+        ypos = pn / (xres * xres)
+        incir = (xpos - 0.5) ** 2 + (ypos - 0.5) ** 2 < 0.25
+        rays[:, 3:] *= incir[:, None]
+        out.write(rays.tobytes())
+        recno += len(rays)
+
+
+def write_rays(rays: bytes, inp: Optional[IO[bytes]], out: IO[bytes]) -> None:
+    """Ray pipeline stage writing out rays already in memory."""
+    out.write(rays)
+
+
+def run_stage(
+    stage, inp: Optional[IO[bytes]], out: IO[bytes], errors: list
+) -> None:
+    """Run a python stage of a ray pipeline, closing both ends when done."""
+    try:
+        stage(inp, out)
+    except BrokenPipeError:
+        # The consumer stopped reading, it reports its own failure.
+        pass
+    except Exception as err:
+        errors.append(err)
+    finally:
+        if inp is not None:
+            inp.close()
+        try:
+            out.close()
+        except BrokenPipeError:
+            pass
+
+
+@contextmanager
+def view_rays(sender: Sender) -> Iterator[IO[bytes]]:
+    """
+    Stream the rays of a view sender through a pipe.
+    The commands stored in the sender are chained together and
+    the rays are never written to disk. Callable stages run in
+    a thread and take the input and output streams as arguments.
+
+    Args:
+        sender: a view sender, holding either the ray generating stages
+            or the rays themselves as bytes
+    Yields:
+        Readable stream of the rays
+    Raises:
+        CalledProcessError if any ray generating command fails.
+        A command killed by SIGPIPE is not considered failed, as it
+        only means the consumer stopped reading.
+    """
+    stages = sender.sender
+    if isinstance(stages, bytes):
+        stages = (partial(write_rays, stages),)
+    procs = []
+    threads = []
+    errors: list = []
+    stream = None
+    for stage in stages:
+        if callable(stage):
+            rfd, wfd = os.pipe()
+            thread = Thread(
+                target=run_stage, args=(stage, stream, os.fdopen(wfd, "wb"), errors)
+            )
+            thread.start()
+            threads.append(thread)
+            stream = os.fdopen(rfd, "rb")
+            continue
+        proc = sp.Popen(stage, stdin=stream, stdout=sp.PIPE)
+        if stream is not None:
+            stream.close()
+        stream = proc.stdout
+        procs.append(proc)
+    try:
+        yield stream
+    finally:
+        stream.close()
+        for thread in threads:
+            thread.join()
+        for proc in procs:
+            proc.wait()
+    # SIGPIPE doesn't exist on Windows
+    sigpipe = getattr(signal, "SIGPIPE", None)
+    for proc in procs:
+        if proc.returncode != 0 and (
+            sigpipe is None or proc.returncode != -sigpipe
+        ):
+            raise sp.CalledProcessError(proc.returncode, proc.args)
+    if errors:
+        raise errors[0]
 
 
 def points_as_sender(pts_list: list, ray_cnt: Optional[int] = None) -> Sender:
@@ -107,9 +270,10 @@ def points_as_sender(pts_list: list, ray_cnt: Optional[int] = None) -> Sender:
         raise ValueError("pts_list is None")
     if not all(isinstance(item, list) for item in pts_list):
         raise ValueError("All grid points has to be lists.")
-    pts_list = [i for i in pts_list for _ in range(ray_cnt)]
-    grid_str = os.linesep.join([" ".join(map(str, li)) for li in pts_list]) + os.linesep
-    return Sender("p", grid_str.encode(), None, len(pts_list))
+    grid_str = "".join(
+        (" ".join(map(str, li)) + os.linesep) * ray_cnt for li in pts_list
+    )
+    return Sender("p", grid_str.encode(), None, len(pts_list) * ray_cnt)
 
 
 def sun_as_receiver(basis, smx_path, window_normals, full_mod=False) -> Receiver:
@@ -123,6 +287,7 @@ def sun_as_receiver(basis, smx_path, window_normals, full_mod=False) -> Receiver
     Returns:
         A sun receiver object
     """
+    from frads import sky
 
     # gensun = sky.Gensun(int(basis[-1]))
     if (smx_path is None) and (window_normals is None):
@@ -145,6 +310,8 @@ def sky_as_receiver(basis) -> Receiver:
         A sky receiver object
     """
 
+    from frads import sky
+
     if not basis.startswith("r"):
         raise ValueError(f"Sky basis need to be Treganza/Reinhart, found {basis}")
     sky_str = sky.basis_glow(basis)
@@ -179,6 +346,77 @@ def surface_as_receiver(
     return Receiver(rcvr_str, basis)
 
 
+def merge_receivers(receivers: Sequence[Receiver]) -> Receiver:
+    """
+    Merge receivers in one pass, equivalent to adding them up in order
+    without building the intermediate receiver strings.
+
+    Args:
+        receivers: receivers to merge, the first one sets basis and modifier
+    Returns:
+        The merged receiver
+    """
+    first = receivers[0]
+    return Receiver(
+        "\n".join(rcvr.receiver for rcvr in receivers), first.basis, first.modifier
+    )
+
+
+def polygon_normals(verts):
+    """
+    Compute the unit normals of many polygons at once.
+
+    Args:
+        verts: array of shape (N, M, 3) with the vertices of N polygons,
+            only the first three vertices of each polygon are used.
+    Returns:
+        Array of shape (N, 3) of the polygon normals
+    """
+    import numpy as np
+
+    normals = np.cross(verts[:, 1] - verts[:, 0], verts[:, 2] - verts[:, 0])
+    normals /= np.sqrt(np.einsum("ij,ij->i", normals, normals))[:, None]
+    return normals
+
+
+def offset_polygons(real_args: Sequence[str], offset: float) -> List[str]:
+    """
+    Move polygons along their normal direction.
+
+    With numpy, the vertices are read straight from the real arguments
+    into one padded array and all polygons are moved together.
+
+    Args:
+        real_args: polygon real argument strings
+        offset: distance to move
+    Returns:
+        The real argument strings of the moved polygons
+    """
+    if not NUMPY_FOUND:
+        moved_args = []
+        for real_arg in real_args:
+            poly = parsers.parse_polygon(real_arg)
+            offset_vec = poly.normal().scale(offset)
+            moved_pts = [pt + offset_vec for pt in poly.vertices]
+            moved_args.append(geom.Polygon(moved_pts).to_real())
+        return moved_args
+    import numpy as np
+
+    coords = [real_arg.split() for real_arg in real_args]
+    counts = [int(coord[0]) // 3 for coord in coords]
+    verts = np.zeros((len(coords), max(counts), 3))
+    for idx, (count, coord) in enumerate(zip(counts, coords)):
+        verts[idx, :count] = np.array(coord[1 : 3 * count + 1], dtype=float).reshape(
+            count, 3
+        )
+    verts += (polygon_normals(verts) * offset)[:, None, :]
+    moved_args = []
+    for count, pts in zip(counts, verts):
+        vert_str = " ".join(f"{val:f}" for val in pts[:count].ravel())
+        moved_args.append(f"{3 * count} {vert_str}")
+    return moved_args
+
+
 def prepare_surface(*, prims, basis, left, offset, source, out) -> str:
     """
     Prepare the sender or receiver surface, adding appropriate tags.
@@ -209,26 +447,39 @@ def prepare_surface(*, prims, basis, left, offset, source, out) -> str:
     if source is not None:
         source_line = f"void {source} {src_mod}\n0\n0\n4 1 1 1 0\n\n"
         header += source_line
-    modifiers = [p.modifier for p in prims]
-    content = ""
-    for prim in prims:
-        if prim.identifier in modifiers:
+    if offset is not None:
+        real_args = offset_polygons([prim.real_arg for prim in prims], offset)
+    else:
+        real_args = [prim.real_arg for prim in prims]
+    content = [header]
+    for prim, _real_args in zip(prims, real_args):
+        if prim.identifier in modifier_set:
             _identifier = "discarded"
         else:
             _identifier = prim.identifier
-        _modifier = src_mod
-        if offset is not None:
-            poly = parsers.parse_polygon(prim.real_arg)
-            offset_vec = poly.normal().scale(offset)
-            moved_pts = [pt + offset_vec for pt in poly.vertices]
-            _real_args = geom.Polygon(moved_pts).to_real()
-        else:
-            _real_args = prim.real_arg
         new_prim = Primitive(
-            _modifier, prim.ptype, _identifier, prim.str_arg, _real_args
+            src_mod, prim.ptype, _identifier, prim.str_arg, _real_args
         )
-        content += str(new_prim) + "\n"
-    return header + content
+        content.append(f"{new_prim}\n")
+    return "".join(content)
+
+
+def write_temp(tempd: str, name: str, content: Union[str, bytes]) -> str:
+    """
+    Write content to a file in a temporary directory in a single call.
+
+    Args:
+        tempd: temporary directory
+        name: file name
+        content: text or bytes to write
+    Returns:
+        Path to the written file
+    """
+    path = os.path.join(tempd, name)
+    mode = "wb" if isinstance(content, bytes) else "w"
+    with open(path, mode) as wtr:
+        wtr.write(content)
+    return path
 
 
 def rfluxmtx(*, sender, receiver, env, opt=None, out=None):
@@ -241,31 +492,25 @@ def rfluxmtx(*, sender, receiver, env, opt=None, out=None):
         env: model environment, basically anything that's not the
             sender or receiver
         opt: option string
-        out: output path
+        out: output path, a directory for view senders. For other senders,
+            rfluxmtx writes the matrix straight into this file.
 
     Returns:
-        return the stdout of the rfluxmtx run.
+        return the stdout of the rfluxmtx run, or None if written to out.
     """
     if None in (sender, receiver):
         raise ValueError("Sender/Receiver object is None")
     opt = "" if opt is None else opt
-    with tf.TemporaryDirectory() as tempd:
-        receiver_path = os.path.join(tempd, "receiver")
-        with open(receiver_path, "w") as wtr:
-            wtr.write(receiver.receiver)
+    with tf.TemporaryDirectory(dir=TMPDIR) as tempd:
+        receiver_path = write_temp(tempd, "receiver", receiver.receiver)
         if isinstance(env[0], dict):
-            env_path = os.path.join(tempd, "env")
-            with open(env_path, "w") as wtr:
-                [wtr.write(str(prim)) for prim in env]
-            env_paths = [env_path]
+            env_paths = [write_temp(tempd, "env", "".join(map(str, env)))]
         else:
             env_paths = env
-        cmd = ["rfluxmtx"] + opt.split()
+        cmd = ["rfluxmtx", *opt2args(opt)]
         stdin = None
         if sender.form == "s":
-            sender_path = os.path.join(tempd, "sender")
-            with open(sender_path, "wb") as wtr:
-                wtr.write(sender.sender)
+            sender_path = write_temp(tempd, "sender", sender.sender)
             cmd.extend([sender_path, receiver_path])
         elif sender.form == "p":
             cmd.extend(["-I+", "-faa", "-y", str(sender.yres), "-", receiver_path])
@@ -278,14 +523,137 @@ def rfluxmtx(*, sender, receiver, env, opt=None, out=None):
                 out = out / "%04d.hdr"
                 cmd.extend(["-o", str(out)])
             cmd.extend(["-", receiver_path])
-            stdin = sender.sender
+            cmd.extend(env_paths)
+            logger.debug(cmd)
+            with view_rays(sender) as rays:
+                proc = sp.run(cmd, stdin=rays, stderr=sp.PIPE, stdout=sp.PIPE)
+                if proc.stderr != b"":
+                    logger.warning(proc.stderr)
+            return proc.stdout
         cmd.extend(env_paths)
-        return utils.spcheckout(cmd, inp=stdin)
+        if out is None:
+            return utils.spcheckout(cmd, inp=stdin)
+        logger.debug(cmd)
+        with open(out, "wb", buffering=2**20) as wtr:
+            proc = sp.run(cmd, input=stdin, stderr=sp.PIPE, stdout=wtr)
+        if proc.stderr != b"":
+            logger.warning(proc.stderr)
+        return None
+
+
+def rfluxmtx_batch(jobs: Sequence[dict], max_workers: Optional[int] = None) -> list:
+    """
+    Run independent rfluxmtx jobs concurrently.
+    Each rfluxmtx may already use several processes through its -n option,
+    so by default the number of concurrent jobs is the cpu count divided by
+    the largest -n found in the job options.
+
+    Args:
+        jobs: keyword arguments to rfluxmtx, one dictionary per job
+        max_workers: maximum number of concurrent jobs
+    Returns:
+        The stdout of each rfluxmtx run, in the order of the jobs.
+    """
+    if max_workers is None:
+        nproc = 1
+        for job in jobs:
+            opt = opt2args(job.get("opt") or "")
+            if "-n" in opt:
+                nproc = max(nproc, int(opt[opt.index("-n") + 1]))
+        max_workers = max(1, (os.cpu_count() or 1) // nproc)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(rfluxmtx, **job) for job in jobs]
+        return [future.result() for future in futures]
+
+
+def oct_cache_dir() -> Path:
+    """Get the octree cache directory, creating it if needed."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    cache_dir = Path(cache_home, "frads", "oct")
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def evict_oct_cache(cache_dir: Path, size_cap: int = OCT_CACHE_SIZE_CAP) -> None:
+    """
+    Remove least recently used octrees until the cache fits under the size cap.
+
+    Args:
+        cache_dir: octree cache directory
+        size_cap: maximum total size in bytes
+    Returns:
+        None
+    """
+    entries = []
+    with os.scandir(cache_dir) as itr:
+        for entry in itr:
+            if entry.name.endswith(".oct") and entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= size_cap:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def oct_cache_key(receiver, env) -> Optional[str]:
+    """
+    Hash the receiver and the environment files into an octree cache key.
+
+    Args:
+        receiver: receiver object
+        env: environment file paths
+    Returns:
+        The cache key, or None if the octree depends on anything besides
+        these files, i.e. inline commands, instances, meshes or options.
+    """
+    hasher = hashlib.blake2b(receiver.receiver.encode())
+    for path in env:
+        try:
+            with open(path, "rb") as rdr:
+                content = rdr.read()
+        except OSError:
+            return None
+        if OCT_EXTERNAL_REF.search(content):
+            return None
+        hasher.update(len(content).to_bytes(8, "little") + content)
+    return hasher.hexdigest()
+
+
+def run_oconv(receiver, env, oct_path: Union[str, Path]) -> None:
+    """
+    Run oconv on the environment and the receiver, writing to oct_path.
+    The output file is removed if oconv fails.
+
+    Raises:
+        CalledProcessError if oconv fails.
+    """
+    with tf.TemporaryDirectory(dir=TMPDIR) as tempd:
+        receiver_path = write_temp(tempd, "rcvr_path", receiver.receiver)
+        ocmd = ["oconv", "-f"] + env + [receiver_path]
+        logger.debug(ocmd)
+        with open(oct_path, "wb") as wtr:
+            proc = sp.run(ocmd, stdout=wtr, stderr=sp.PIPE)
+    if proc.returncode != 0:
+        os.remove(oct_path)
+        raise sp.CalledProcessError(proc.returncode, ocmd, stderr=proc.stderr)
+    if proc.stderr != b"":
+        logger.warning(proc.stderr)
 
 
 def rcvr_oct(receiver, env, oct_path: Union[str, Path]):
     """
     Generate an octree of the environment and the receiver.
+    Octrees are cached by the content of the receiver and environment files,
+    so repeated calls with the same inputs skip oconv. Environments that
+    pull in other files, through inline commands, instances or meshes, are
+    not cached, nor is anything when the cache directory is not writable
+    or the FRADS_OCT_CACHE environment variable is 0.
 
     Args:
         receiver: receiver object
@@ -293,16 +661,40 @@ def rcvr_oct(receiver, env, oct_path: Union[str, Path]):
         oct_path: Path to write the octree to
     Returns:
         None
+    Raises:
+        CalledProcessError if oconv fails.
     """
-
-    with tf.TemporaryDirectory() as tempd:
-        receiver_path = os.path.join(tempd, "rcvr_path")
-        with open(receiver_path, "w") as wtr:
-            wtr.write(receiver.receiver)
-        ocmd = ["oconv", "-f"] + env + [receiver_path]
-        octree = utils.spcheckout(ocmd)
-        with open(oct_path, "wb") as wtr:
-            wtr.write(octree)
+    if os.environ.get("FRADS_OCT_CACHE") == "0":
+        run_oconv(receiver, env, oct_path)
+        return
+    key = oct_cache_key(receiver, env)
+    if key is None:
+        run_oconv(receiver, env, oct_path)
+        return
+    try:
+        cache_dir = oct_cache_dir()
+        cache_path = cache_dir / f"{key}.oct"
+        if cache_path.is_file():
+            logger.debug("Using cached octree %s", cache_path)
+            os.utime(cache_path)
+            shutil.copyfile(cache_path, oct_path)
+            return
+        with tf.NamedTemporaryFile(dir=cache_dir, suffix=".tmp", delete=False) as wtr:
+            tmp_path = wtr.name
+    except OSError as err:
+        logger.warning("Octree cache unavailable: %s", err)
+        run_oconv(receiver, env, oct_path)
+        return
+    try:
+        run_oconv(receiver, env, tmp_path)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        # Don't leave the partial octree behind in the cache
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    shutil.copyfile(cache_path, oct_path)
+    evict_oct_cache(cache_dir)
 
 
 def rcontrib(*, sender, modifier: str, octree: Union[str, Path], out, opt) -> None:
@@ -320,12 +712,9 @@ def rcontrib(*, sender, modifier: str, octree: Union[str, Path], out, opt) -> No
         None
 
     """
-    lopt = opt.split()
-    lopt.append("-fo+")
-    with tf.TemporaryDirectory() as tempd:
-        modifier_path = os.path.join(tempd, "modifier")
-        with open(modifier_path, "w") as wtr:
-            wtr.write(modifier)
+    lopt = [*opt2args(opt), "-fo+"]
+    with tf.TemporaryDirectory(dir=TMPDIR) as tempd:
+        modifier_path = write_temp(tempd, "modifier", modifier)
         cmd = ["rcontrib"] + lopt
         stdin = sender.sender
         if sender.form == "p":
@@ -336,4 +725,8 @@ def rcontrib(*, sender, modifier: str, octree: Union[str, Path], out, opt) -> No
             out = out / "%04d.hdr"
             cmd += ["-ffc", "-x", str(sender.xres), "-y", str(sender.yres)]
         cmd += ["-o", out, "-M", modifier_path, str(octree)]
-        sp.run(cmd, check=True, input=stdin)
+        if sender.form == "v":
+            with view_rays(sender) as rays:
+                sp.run(cmd, check=True, stdin=rays)
+        else:
+            sp.run(cmd, check=True, input=stdin)
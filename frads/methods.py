@@ -49,12 +49,12 @@ def get_window_group(config: ConfigParser) -> Tuple[dict, list]:
 def get_wea_data(config: ConfigParser) -> Tuple[WeaMetaData, List[WeaDataRow], str]:
     """Get wea data and parse into appropriate data types."""
     if (wea_path := config["Site"]["wea_path"]) != "":
-        logger.info("Using user specified %s file." % wea_path)
+        logger.info("Using user specified %s file.", wea_path)
         name = Path(wea_path).stem
         with open(wea_path) as rdr:
             wea_metadata, wea_data = parsers.parse_wea(rdr.read())
     elif (epw_path := config["Site"]["epw_path"]) != "":
-        logger.info(f"Converting {epw_path} to a .wea file")
+        logger.info("Converting %s to a .wea file", epw_path)
         name = Path(epw_path).stem
         with open(epw_path, "r") as rdr:
             wea_metadata, wea_data = parsers.parse_epw(rdr.read())
@@ -169,14 +169,20 @@ def prep_2phase_pt(mpath: MradPath, model: MradModel, config: ConfigParser) -> N
     opt = config["SimControl"]["dsmx_opt"]
     opt += f' -n {config["SimControl"]["nprocess"]}'
     overwrite = config.getboolean("SimControl", "overwrite", fallback=False)
+    jobs = []
     for grid_name, sender_grid in model.sender_grid.items():
         mpath.pdsmx[grid_name] = Path("Matrices", f"pdsmx_{grid_name}.mtx")
         if (not mpath.pdsmx[grid_name].is_file()) or overwrite:
-            res = matrix.rfluxmtx(
-                sender=sender_grid, receiver=model.receiver_sky, env=env, opt=opt
+            jobs.append(
+                dict(
+                    sender=sender_grid,
+                    receiver=model.receiver_sky,
+                    env=env,
+                    opt=opt,
+                    out=mpath.pdsmx[grid_name],
+                )
             )
-            with open(mpath.pdsmx[grid_name], "wb") as wtr:
-                wtr.write(res)
+    matrix.rfluxmtx_batch(jobs)
 
 
 def prep_2phase_vu(mpath: MradPath, model: MradModel, config: ConfigParser) -> None:
@@ -187,17 +193,21 @@ def prep_2phase_vu(mpath: MradPath, model: MradModel, config: ConfigParser) -> N
     opt = config["SimControl"]["dsmx_opt"]
     opt += f' -n {config["SimControl"]["nprocess"]}'
     overwrite = config.getboolean("SimControl", "overwrite", fallback=False)
+    jobs = []
     for view_name, sender_view in model.sender_view.items():
         mpath.vdsmx[view_name] = Path("Matrices", f"vdsmx_{view_name}")
         if (not mpath.vdsmx[view_name].is_dir()) or overwrite:
-            logger.info("Generating for %s" % view_name)
-            matrix.rfluxmtx(
-                sender=sender_view,
-                receiver=model.receiver_sky,
-                env=env,
-                opt=opt,
-                out=mpath.vdsmx[view_name],
+            logger.info("Generating for %s", view_name)
+            jobs.append(
+                dict(
+                    sender=sender_view,
+                    receiver=model.receiver_sky,
+                    env=env,
+                    opt=opt,
+                    out=mpath.vdsmx[view_name],
+                )
             )
+    matrix.rfluxmtx_batch(jobs)
 
 
 def view_matrix_pt(
@@ -212,7 +222,7 @@ def view_matrix_pt(
         _env = [model.material_path, model.black_env_path]
     else:
         logger.info("Computing view matrix for sensor grid:")
-    receiver_windows = Receiver(receiver="", basis=config["SimControl"]["vmx_basis"])
+    receivers = [Receiver(receiver="", basis=config["SimControl"]["vmx_basis"])]
     for grid_name, sender_grid in model.sender_grid.items():
         for wname, window_prim in model.window_groups.items():
             _name = grid_name + wname
@@ -222,14 +232,17 @@ def view_matrix_pt(
             else:
                 mpath.pvmx[_name] = Path("Matrices", f"pvmx_{_name}.mtx")
                 out = mpath.pvmx[_name]
-            receiver_windows += matrix.surface_as_receiver(
-                prim_list=window_prim,
-                basis=config["SimControl"]["vmx_basis"],
-                offset=None,
-                left=None,
-                source="glow",
-                out=out,
+            receivers.append(
+                matrix.surface_as_receiver(
+                    prim_list=window_prim,
+                    basis=config["SimControl"]["vmx_basis"],
+                    offset=None,
+                    left=None,
+                    source="glow",
+                    out=out,
+                )
             )
+        receiver_windows = matrix.merge_receivers(receivers)
         if direct:
             files_exist = all([f.is_file() for f in mpath.pvmxd.values()])
         else:
@@ -261,7 +274,7 @@ def view_matrix_vu(
     _opt += f' -n {config["SimControl"]["nprocess"]}'
     overwrite = config.getboolean("SimControl", "overwrite", fallback=False)
     for view, sender_view in model.sender_view.items():
-        vrcvr_windows = Receiver(receiver="", basis=config["SimControl"]["vmx_basis"])
+        vrcvrs = [Receiver(receiver="", basis=config["SimControl"]["vmx_basis"])]
         for wname, window_prim in model.window_groups.items():
             _name = view + wname
             if direct:
@@ -271,12 +284,15 @@ def view_matrix_vu(
                 mpath.vvmx[_name] = Path("Matrices", f"vvmx_{_name}", "%04d.hdr")
                 out = mpath.vvmx[_name]
             out.parent.mkdir(exist_ok=True)
-            vrcvr_windows += matrix.surface_as_receiver(
-                prim_list=window_prim,
-                basis=config["SimControl"]["vmx_basis"],
-                source="glow",
-                out=out,
+            vrcvrs.append(
+                matrix.surface_as_receiver(
+                    prim_list=window_prim,
+                    basis=config["SimControl"]["vmx_basis"],
+                    source="glow",
+                    out=out,
+                )
             )
+        vrcvr_windows = matrix.merge_receivers(vrcvrs)
         if direct:
             exists = all(
                 [
@@ -292,7 +308,7 @@ def view_matrix_vu(
                 ]
             )
         if (not exists) or overwrite:
-            logger.info(f"Computing{direct_msg} image-based view matrix")
+            logger.info("Computing%s image-based view matrix", direct_msg)
             matrix.rfluxmtx(
                 sender=sender_view, receiver=vrcvr_windows, env=_env, opt=_opt, out=None
             )
@@ -367,15 +383,13 @@ def daylight_matrix(
         )
         if regen(out, config):
             logger.info("Generating daylight matrix for %s", _name)
-            dmx_res = matrix.rfluxmtx(
+            matrix.rfluxmtx(
                 sender=sndr_window,
                 receiver=model.receiver_sky,
                 env=dmx_env,
-                out=None,
+                out=out,
                 opt=dmx_opt,
             )
-            with open(out, "wb") as wtr:
-                wtr.write(dmx_res)
 
 
 def blacken_env(model: MradModel, config: ConfigParser) -> Tuple[str, str]:
@@ -583,7 +597,7 @@ def direct_sun_matrix_vu(
         tempf = Path("Matrices", "vcdfmx")
         tempr = Path("Matrices", "vcdrmx")
         if regen(mpath.vcdfmx[view], config):
-            logger.info(f"Generating direct sun f matrix for {view}")
+            logger.info("Generating direct sun f matrix for %s", view)
             matrix.rcontrib(
                 sender=sndr,
                 modifier=rcvr_sun.modifier,
@@ -596,7 +610,7 @@ def direct_sun_matrix_vu(
                 file.replace(mpath.vcdfmx[view] / (mod_names[idx] + ".hdr"))
             shutil.rmtree(tempf)
         if regen(mpath.vcdrmx[view], config):
-            logger.info(f"Generating direct sun r matrix for {view}")
+            logger.info("Generating direct sun r matrix for %s", view)
             matrix.rcontrib(
                 sender=sndr,
                 modifier=rcvr_sun.modifier,
@@ -799,7 +813,7 @@ def calc_5phase_vu(
     """Compute for image-based 5-phase method result."""
     nprocess = config.getint("SimControl", "nprocess")
     for view in model.sender_view:
-        logger.info(f"Computing for image-based results for {view}")
+        logger.info("Computing for image-based results for %s", view)
         vresl = []
         vdresl = []
         with tf.TemporaryDirectory() as td:
@@ -918,7 +932,7 @@ def calc_5phase_vu(
                     if ni % nprocess == 0:
                         proc.wait()
                 proc.wait()
-            logger.info(f"Done computing for {view}")
+            logger.info("Done computing for %s", view)
 
 
 def regen(path: Path, config) -> bool:
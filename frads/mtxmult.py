@@ -134,11 +134,10 @@ def rpxop():
 
 def combine_mtx(mtxs, out_dir):
     """."""
-    cmd = "rmtxop"
-    args = " -ff %s > %s" % (" ".join(mtxs), out_dir)
-    process = sp.Popen(cmd + args, stdout=sp.PIPE, stderr=sp.PIPE, shell=True)
-    _, stderr = process.communicate()
-    return stderr
+    cmd = ["rmtxop", "-ff", *map(str, mtxs)]
+    with open(out_dir, "wb") as wtr:
+        process = sp.run(cmd, stdout=wtr, stderr=sp.PIPE)
+    return process.stderr
 
 
 def mtxstr2nparray(data_str: bytes):
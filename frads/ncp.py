@@ -4,11 +4,14 @@ This module contains functionalities relating to generating matrices for
 non-coplanar shading systems
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from dataclasses import field
 import logging
 import math
 import os
 from pathlib import Path
+import re
 import shutil
 import subprocess as sp
 import tempfile as tf
@@ -18,27 +21,82 @@ from typing import Sequence
 
 from frads import matrix
 from frads import geom
+from frads import mtxmult
 from frads import parsers
 from frads.types import Primitive
 from frads import utils
 
+try:
+    import numpy as np
+
+    NUMPY_FOUND = True
+except ModuleNotFoundError:
+    NUMPY_FOUND = False
+
 logger = logging.getLogger("frads.mfacade")
 
+# Photopic weights applied to the RGB channels before wrapping
+LUM_WEIGHTS = (0.265, 0.67, 0.065)
+
+# Index of the geom.getbbox faces by their outward normal
+BBOX_FACE_INDEX = {(1, 0, 0): 2, (0, -1, 0): 3, (-1, 0, 0): 4, (0, 1, 0): 5}
+
+KLEMS_BASIS = {"kq": "Klems Quarter", "kh": "Klems Half", "kf": "Klems Full"}
+
+# Integral wavelength tags in a BSDF XML, swapped to wrap the solar spectrum
+WAVELENGTH_SWAP = {"Visible": "Solar", "Solar": "Visible"}
+WAVELENGTH_TAG = re.compile(
+    r'(?<=<Wavelength unit="Integral">)(Visible|Solar)(?=</Wavelength>)'
+)
+
 
 @dataclass
 class Model:
+    """
+    Non-coplanar shading system model.
+
+    Attributes:
+        windows: window primitives
+        ports: port primitives enclosing the windows and the shading system
+        env: environment file paths
+        sbasis: sender sampling basis
+        rbasis: receiver sampling basis
+        window_flip_prims: flipped window primitives, used as back receivers
+        port_flip_prims: flipped port primitives, used as back sender
+    """
+
     windows: Sequence[Primitive]
     ports: Sequence[Primitive]
     env: Sequence[Path]
     sbasis: str
     rbasis: str
+    window_flip_prims: List[Primitive] = field(init=False, repr=False)
+    port_flip_prims: List[Primitive] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.window_flip_prims = [
+            utils.polygon2prim(
+                parsers.parse_polygon(wp.real_arg).flip(), "breceiver", f"window{idx}"
+            )
+            for idx, wp in enumerate(self.windows)
+        ]
+        self.port_flip_prims = [
+            Primitive(
+                p.modifier,
+                p.ptype,
+                p.identifier,
+                p.str_arg,
+                parsers.parse_polygon(p.real_arg).flip().to_real(),
+            )
+            for p in self.ports
+        ]
 
 
 def ncp_compute_back(model: Model, src_dict: dict, opt: str, refl=False):
     """compute front side calculation(backwards)."""
     logger.info("Computing for front side")
     for idx, wp in enumerate(model.windows):
-        logger.info(f"Front transmission for window {idx}")
+        logger.info("Front transmission for window %s", idx)
         front_rcvr = matrix.surface_as_receiver(
             prim_list=model.ports,
             basis=model.rbasis,
@@ -52,11 +110,9 @@ def ncp_compute_back(model: Model, src_dict: dict, opt: str, refl=False):
             prim_list=[wp], basis=model.sbasis, left=True, offset=None
         )
         if refl:
-            logger.info(f"Front reflection for window {idx}")
-            wflip = parsers.parse_polygon(wp.real_arg).flip()
-            wflip_prim = utils.polygon2prim(wflip, "breceiver", f"window{idx}")
+            logger.info("Front reflection for window %s", idx)
             back_rcvr = matrix.surface_as_receiver(
-                prim_list=[wflip_prim],
+                prim_list=[model.window_flip_prims[idx]],
                 basis="-" + model.rbasis,
                 left=False,
                 offset=None,
@@ -70,86 +126,207 @@ def ncp_compute_back(model: Model, src_dict: dict, opt: str, refl=False):
 
 
 def ncp_compute_front(model: Model, src_dict, opt, refl=False):
-    """compute back side calculation."""
-    sndr_prim = []
-    for p in model.ports:
-        np = Primitive(
-            p.modifier,
-            p.ptype,
-            p.identifier,
-            p.str_arg,
-            parsers.parse_polygon(p.real_arg).flip().to_real(),
-        )
-        sndr_prim.append(np)
+    """compute back side calculation.
+
+    The flipped ports are the only sender, so the receivers for all
+    windows are traced in a single rfluxmtx call.
+    """
     sndr = matrix.surface_as_sender(
-        prim_list=sndr_prim, basis="-" + model.rbasis, offset=None, left=False
+        prim_list=model.port_flip_prims,
+        basis="-" + model.rbasis,
+        offset=None,
+        left=False,
     )
     logger.info("Computing for back side")
-    for idx, wp in enumerate(model.windows):
-        logger.info(f"Back transmission for window {idx}")
-        wplg = parsers.parse_polygon(wp.real_arg).flip()
-        rcvr_prim = utils.polygon2prim(wplg, "breceiver", f"window{idx}")
-        rcvr = matrix.surface_as_receiver(
-            prim_list=[rcvr_prim],
-            basis="-" + model.sbasis,
+    rcvrs = []
+    for idx, wflip_prim in enumerate(model.window_flip_prims):
+        logger.info("Back transmission for window %s", idx)
+        rcvrs.append(
+            matrix.surface_as_receiver(
+                prim_list=[wflip_prim],
+                basis="-" + model.sbasis,
+                left=False,
+                offset=None,
+                source="glow",
+                out=src_dict[f"tf{idx}"],
+            )
+        )
+    if refl:
+        # Same sender and receiver for every window, trace it only once.
+        logger.info("Back reflection for all windows")
+        brcvr = matrix.surface_as_receiver(
+            prim_list=model.ports,
+            basis=model.rbasis,
             left=False,
             offset=None,
             source="glow",
-            out=src_dict[f"tf{idx}"],
+            out=src_dict["rf0"],
         )
-        if refl:
-            logger.info(f"Back reflection for window {idx}")
-            # brcvr_prim = [utils.polygon2prim(plg, "freceiver", "window" + str(i)) for i, pp in enumerate(model.ports)]
-            brcvr = matrix.surface_as_receiver(
-                prim_list=model.ports,
-                basis=model.rbasis,
-                left=False,
-                offset=None,
-                source="glow",
-                out=src_dict[f"rf{idx}"],
+        rcvrs.append(brcvr)
+    rcvr = matrix.merge_receivers(rcvrs)
+    matrix.rfluxmtx(sender=sndr, receiver=rcvr, env=model.env, out=None, opt=opt)
+    if refl:
+        for idx in range(1, len(model.windows)):
+            shutil.copyfile(src_dict["rf0"], src_dict[f"rf{idx}"])
+
+
+def ncp_compute(model: Model, src_dict: dict, opt: str, refl=False, forw=False):
+    """Compute all the matrices for a non-coplanar shading system.
+
+    Args:
+        model: ncp model
+        src_dict: output path of each matrix, keyed by tb, rb, tf, rf + window index
+        opt: rfluxmtx option string
+        refl: compute reflection
+        forw: compute back side (forward) matrices as well
+    """
+    ncp_compute_back(model, src_dict, opt, refl=refl)
+    if forw:
+        ncp_compute_front(model, src_dict, opt, refl=refl)
+
+
+def lum_transpose(inp):
+    """Combine the RGB channels of a matrix file into luminance and transpose it.
+
+    Equivalent to rmtxop -fa -t -c .265 .67 .065, without the header.
+
+    Args:
+        inp: Radiance matrix file path
+
+    Returns:
+        Transposed luminance matrix as a numpy array
+    """
+    with open(inp, "rb") as rdr:
+        rdata, gdata, bdata = mtxmult.mtxstr2nparray(rdr.read())
+    wr, wg, wb = LUM_WEIGHTS
+    return (rdata * wr + gdata * wg + bdata * wb).T
+
+
+def rmtxop_lum_transpose(inp) -> bytes:
+    """Call rmtxop to combine RGB into luminance and transpose a matrix.
+
+    Args:
+        inp: Radiance matrix file path
+
+    Returns:
+        The ascii matrix data with the header stripped
+    """
+    cmd = ["rmtxop", "-fa", "-t", "-c", *map(str, LUM_WEIGHTS), str(inp)]
+    raw = utils.spcheckout(cmd)
+    return raw.split(b"\n\n", 1)[-1]
+
+
+def wrap_window(wrap_opt: List[str], sub_dict: dict, out_name: Path) -> None:
+    """Call wrapBSDF to wrap the matrices of a single window into a XML file.
+
+    Args:
+        wrap_opt: wrapBSDF options, e.g. basis and spectrum
+        sub_dict: matrix file paths keyed by tb, rb, tf, rf + window index
+        out_name: output XML file path
+    """
+    cmd = ["wrapBSDF", *wrap_opt]
+    for key, path in sub_dict.items():
+        cmd.extend(["-" + key[:2], str(path)])
+    with open(out_name, "wb") as wtr:
+        sp.run(cmd, stdout=wtr)
+
+
+def wrap_windows(model, fwrap_dict, out, wrap_opt: List[str]) -> None:
+    """Wrap each window into its own XML file, concurrently."""
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = [
+            executor.submit(
+                wrap_window,
+                wrap_opt,
+                {k: v for k, v in fwrap_dict.items() if k[2:] == str(i)},
+                out.parent / f"{out.stem}{i}.xml",
             )
-            rcvr += brcvr
-        matrix.rfluxmtx(sender=sndr, receiver=rcvr, env=model.env, out=None, opt=opt)
+            for i, _ in enumerate(model.windows)
+        ]
+        for future in futures:
+            future.result()
 
 
 def klems_wrap(model, src_dict, fwrap_dict, out):
     """prepare wrapping for Klems basis."""
     for key in src_dict:
-        for _, _ in enumerate(model.windows):
-            inp = src_dict[key]
-            rcmd = ["rmtxop", "-fa", "-t", "-c", ".265", ".67", ".065", inp]
-            ps1 = sp.run(rcmd, stdout=sp.PIPE)
-            with open(fwrap_dict[key], "wb") as wtr:
-                sp.run(["getinfo", "-"], input=ps1.stdout, stdout=wtr)
-    for i, _ in enumerate(model.window):
-        out_name = out.parent / (out.stem + f"{i}.xml")
-        sub_dict = {k: fwrap_dict[k] for k in fwrap_dict if k.endswith(str(i))}
-        cmd = ["wrapBSDF", "-a", model.rbasis, "-c"]
-        cmd.extend([" ".join(("-" + i[:2], j)) for i, j in sub_dict.items()])
-        with open(out_name, "wb") as wtr:
-            sp.run(cmd, stdout=wtr)
-
-
-def klems_wrap2(out, out2, inp, basis):
-    """prepare wrapping for Klems basis."""
-    cmd = f"rmtxop -fa -t -c .265 .67 .065 {inp} | getinfo - > {out}"
-    sp.run(cmd, shell=True)
-    basis_dict = {"kq": "Klems Quarter", "kh": "Klems Half", "kf": "Klems Full"}
-    coeff = utils.angle_basis_coeff(basis_dict[basis])
-    with open(out, "r") as rdr:
-        rows = [map(float, l.split()) for l in rdr.readlines()]
-    res = [[str(val / c) for val in row] for row, c in zip(rows, coeff)]
-    with open(out2, "w") as wtr:
-        [wtr.write("\t".join(row) + "\n") for row in res]
+        inp = src_dict[key]
+        if NUMPY_FOUND:
+            lum = lum_transpose(inp)
+            np.savetxt(fwrap_dict[key], lum, fmt="%.7g", delimiter="\t")
+            continue
+        with open(fwrap_dict[key], "wb") as wtr:
+            wtr.write(rmtxop_lum_transpose(inp))
+    wrap_windows(model, fwrap_dict, out, ["-a", model.rbasis, "-c"])
+
+
+def klems_wrap2(out, inp, basis):
+    """prepare wrapping for Klems basis, scaled by the basis coefficients."""
+    coeff = utils.angle_basis_coeff(KLEMS_BASIS[basis])
+    if NUMPY_FOUND:
+        lum = lum_transpose(inp)
+        lum /= np.asarray(coeff)[:, None]
+        np.savetxt(out, lum, fmt="%.7g", delimiter="\t")
+        return
+    data = rmtxop_lum_transpose(inp).decode()
+    with open(out, "w") as wtr:
+        for line, c in zip(data.splitlines(), coeff):
+            wtr.write("\t".join(f"{float(val) / c:.7g}" for val in line.split()))
+            wtr.write("\n")
+
+
+def cie_transform(rgb, spec: str, ns2: int):
+    """Numpy counterpart of the rcalc CIE expressions used by rttree_reduce.
+
+    Args:
+        rgb: array of RGB triplets, shape (n, 3)
+        spec: {Visible|CIE-u|CIE-v}
+        ns2: number of Shirley-Chiu patches
+
+    Returns:
+        Photopic radiance (Visible) or CIE u'/v' as a float32 array
+    """
+    red, grn, blu = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+    yval = 0.2651 * red + 0.6701 * grn + 0.0648 * blu
+    if spec == "Visible":
+        return (yval / (math.pi / ns2)).astype(np.float32)
+    xval = 0.5141 * red + 0.3239 * grn + 0.1620 * blu
+    zval = 0.0241 * red + 0.1229 * grn + 0.8530 * blu
+    den = xval + 15 * yval + 3 * zval
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if spec == "CIE-u":
+            res = np.where(yval > 0, 4 * xval / den, 4 / 19)
+        elif spec == "CIE-v":
+            res = np.where(yval > 0, 9 * yval / den, 9 / 19)
+        else:
+            raise ValueError(f"Unknown spectrum {spec}")
+    return res.astype(np.float32)
 
 
-def rttree_reduce(ttrank, ttlog2, pctcull, refl, src, dest, spec="Visible"):
-    """call rttree_reduce to reduce shirley-chiu to tensor tree.
-    translated from genBSDF.pl.
+def make_rttree_reducer(ttrank, ttlog2, pctcull, refl, spec="Visible"):
+    """Prepare a rttree_reduce call for fixed tensor tree settings.
+
+    The commands are built once, so the returned function only needs the
+    source and destination paths.
+
+    Args:
+        ttrank: tensor tree rank
+        ttlog2: log2 of the Shirley-Chiu resolution
+        pctcull: culling percentage, negative to skip rttree_reduce
+        refl: whether the matrix is a reflection
+        spec: {Visible|CIE-u|CIE-v}
+
+    Returns:
+        A function taking the source and destination paths
     """
     CIEuv = "Xi=.5141*Ri+.3239*Gi+.1620*Bi;Yi=.2651*Ri+.6701*Gi+.0648*Bi;Zi=.0241*Ri+.1229*Gi+.8530*Bi;den=Xi+15*Yi+3*Zi;uprime=if(Yi,4*Xi/den,4/19);vprime=if(Yi,9*Yi/den,9/19);"
 
     ns2 = int((2**ttlog2) ** 2)
+    pcull = pctcull if spec == "Visible" else (100 - (100 - pctcull) * 0.25)
+    rtcmd = ["rttree_reduce", "-h", "-ff", "-t", str(pcull)]
+    rtcmd += ["-r", str(ttrank), "-g", str(ttlog2)]
+    if refl:
+        rtcmd.insert(1, "-a")
     if spec == "Visible":
         cmd = [
             "rcalc",
@@ -166,42 +343,57 @@ def rttree_reduce(ttrank, ttlog2, pctcull, refl, src, dest, spec="Visible"):
         cmd = ["rcalc", "-e", "Ri=$1;Gi=$2;Bi=$3", "-e", CIEuv, "-e", "$1=uprime"]
     elif spec == "CIE-v":
         cmd = ["rcalc", "-e", "Ri=$1;Gi=$2;Bi=$3", "-e", CIEuv, "-e", "$1=vprime"]
-
-    if os.name == "posix":
+    posix = os.name == "posix"
+    if posix:
         cmd.insert(1, "-if3")
-    if pctcull >= 0:
-        avg = "-a" if refl else ""
-        pcull = pctcull if spec == "Visible" else (100 - (100 - pctcull) * 0.25)
-        rtcmd = [
-            "rttree_reduce",
-            avg,
-            "-h",
-            "-ff",
-            "-t",
-            pcull,
-            "-r",
-            ttrank,
-            "-g",
-            ttlog2,
-        ]
-        if os.name == "posix":
-            cmd.extend(["-of", src])
-            ps1 = sp.run(cmd + ["-of", src], stdout=sp.PIPE)
+        if pctcull >= 0:
+            cmd.append("-of")
+
+    def reduce_with_numpy(src, dest):
+        rgb = np.fromfile(src, dtype=np.float32).reshape(-1, 3)
+        res = cie_transform(rgb, spec, ns2)
+        if pctcull >= 0:
             with open(dest, "wb") as wtr:
-                ps2 = sp.run(rtcmd, input=ps1.stdout, stdout=wtr)
+                sp.run(rtcmd, input=res.tobytes(), stdout=wtr)
         else:
-            ps1 = sp.run(["rcollate", "-ho", "-oc", "1", src], stdout=sp.PIPE)
-            ps2 = sp.run(cmd, input=ps1.stdout, stdout=sp.PIPE)
-            with open(dest, "wb") as wtr:
-                sp.run(rtcmd, input=ps2.stdout, stdout=wtr)
-    else:
-        if os.name == "posix":
-            with open(dest, "wb") as wtr:
-                sp.run(cmd.append(src), stdout=wtr)
+            np.savetxt(dest, res, fmt="%.7g")
+
+    def reduce_with_rcalc(src, dest):
+        # Chain the stages through OS pipes so the intermediate data never
+        # passes through Python.
+        procs = []
+        stdin = None
+        if posix:
+            rccmd = [*cmd, str(src)]
         else:
-            ps1 = sp.run(["rcollate", "-ho", "-oc", "1", src], stdout=sp.PIPE)
-            with open(dest, "wb") as wtr:
-                sp.run(cmd, input=ps1.stdout, stdout=wtr)
+            rccmd = cmd
+            rcollate = sp.Popen(
+                ["rcollate", "-ho", "-oc", "1", str(src)], stdout=sp.PIPE
+            )
+            procs.append(rcollate)
+            stdin = rcollate.stdout
+        with open(dest, "wb") as wtr:
+            if pctcull >= 0:
+                rcalc = sp.Popen(rccmd, stdin=stdin, stdout=sp.PIPE)
+                procs.append(rcalc)
+                last = sp.Popen(rtcmd, stdin=rcalc.stdout, stdout=wtr)
+            else:
+                last = sp.Popen(rccmd, stdin=stdin, stdout=wtr)
+            # Close our copies so upstream stages see a broken pipe if needed
+            for proc in procs:
+                proc.stdout.close()  # type: ignore
+            last.wait()
+        for proc in procs:
+            proc.wait()
+
+    return reduce_with_numpy if NUMPY_FOUND else reduce_with_rcalc
+
+
+def rttree_reduce(ttrank, ttlog2, pctcull, refl, src, dest, spec="Visible"):
+    """call rttree_reduce to reduce shirley-chiu to tensor tree.
+    translated from genBSDF.pl.
+    """
+    make_rttree_reducer(ttrank, ttlog2, pctcull, refl, spec=spec)(src, dest)
 
 
 def tt_wrap(model, src_dict, fwrap_dict, out, refl) -> None:
@@ -212,16 +404,17 @@ def tt_wrap(model, src_dict, fwrap_dict, out, refl) -> None:
     ttrank = 4  # only anisotropic
     pctcull = 90
     ttlog2 = int(ttlog2)
-    for i, _ in enumerate(model.windows):
-        sub_key = [k for k in src_dict if k.endswith(str(i))]
-        sub_dict = {k: fwrap_dict[k] for k in sub_key}
-        for key in sub_key:
-            rttree_reduce(ttrank, ttlog2, pctcull, refl, src_dict[key], fwrap_dict[key])
-        cmd = ["wrapBSDF", "-a", "t4", "-s", "Visible"]
-        cmd += [" ".join(("-" + i[:2], j)) for i, j in sub_dict.items()]
-        cmd += f"> {out}.xml"
-        with open(out, "wb") as wtr:
-            sp.run(cmd, stdout=wtr)
+    reducer = make_rttree_reducer(ttrank, ttlog2, pctcull, refl)
+    # Each reduction is an independent rcalc | rttree_reduce pipeline,
+    # so submit them all at once and let the pool bound the concurrency.
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = [
+            executor.submit(reducer, src_dict[key], fwrap_dict[key])
+            for key in src_dict
+        ]
+        for future in futures:
+            future.result()
+    wrap_windows(model, fwrap_dict, out, ["-a", "t4", "-s", "Visible"])
 
 
 def gen_ncp_mtx(
@@ -232,65 +425,46 @@ def gen_ncp_mtx(
     forw=False,
     wrap=True,
     solar=False,
+    ncp_prims: Optional[Sequence[Primitive]] = None,
 ) -> None:
-
-    # Collect all the primitives
-    all_prims = []
-    for path in model.env:
-        all_prims.extend(utils.unpack_primitives(path))
-
-    # Find out the modifier of the ncp polygon
-    ncp_mod = [prim.modifier for prim in ncp_prims if prim.ptype == "polygon"][0]
-
-    # Find out the ncp material primitive
-    ncp_mat: Primitive
-    ncp_type: str = ""
-    for prim in all_prims:
-        if prim.identifier == ncp_mod:
-            ncp_mat = prim
-            ncp_type = prim.ptype
-            break
-    if ncp_type == "":
-        raise ValueError("Unknown NCP material")
-
-    dirname = out.parent
-    if solar and ncp_type == "BSDF":
-        logger.info("Computing for solar and visible spectrum...")
-        xmlpath = ncp_mat.str_arg.split()[2]
-        td = tf.mkdtemp()
-        with open(xmlpath) as rdr:
-            raw = rdr.read()
-        raw = raw.replace(
-            '<Wavelength unit="Integral">Visible</Wavelength>',
-            '<Wavelength unit="Integral">Visible2</Wavelength>',
-        )
-        raw = raw.replace(
-            '<Wavelength unit="Integral">Solar</Wavelength>',
-            '<Wavelength unit="Integral">Visible</Wavelength>',
-        )
-        raw = raw.replace(
-            '<Wavelength unit="Integral">Visible2</Wavelength>',
-            '<Wavelength unit="Integral">Solar</Wavelength>',
+    """
+    Generate the matrices of a non-coplanar shading system.
+
+    Args:
+        model: non-coplanar shading system model
+        out: output path
+        opt: rfluxmtx options
+        refl: compute reflection as well
+        forw: compute the front side as well
+        wrap: wrap the matrices into BSDF xml files
+        solar: also compute the solar spectrum, needs ncp_prims
+        ncp_prims: primitives of the non-coplanar shading system
+    Returns:
+        None
+    Raises:
+        NotImplementedError: if solar is set, the solar matrices
+            are not computed yet.
+    """
+    ncp_type = ""
+    if solar:
+        raise NotImplementedError("Solar spectrum NCP matrices are not supported yet")
+        if ncp_prims is None:
+            raise ValueError("Need the NCP primitives to compute the solar spectrum")
+        # Find out the modifier of the ncp polygon
+        ncp_mod = [prim.modifier for prim in ncp_prims if prim.ptype == "polygon"][0]
+
+        # Find out the ncp material primitive, stopping at the first match
+        env_prims = (
+            prim for path in model.env for prim in utils.unpack_primitives(path)
         )
-        solar_xml_path = os.path.join(td, "solar.xml")
-        with open(solar_xml_path, "w") as wtr:
-            wtr.write(raw)
-        _strarg = ncp_mat.str_arg.split()
-        _strarg[2] = solar_xml_path
-        solar_ncp_mat = Primitive(
-            ncp_mat.modifier,
-            ncp_mat.ptype,
-            ncp_mat.identifier + ".solar",
-            " ".join(_strarg),
-            "0",
+        ncp_mat = next(
+            (prim for prim in env_prims if prim.identifier == ncp_mod), None
         )
+        if ncp_mat is None:
+            raise ValueError("Unknown NCP material")
+        ncp_type = ncp_mat.ptype
 
-        _env_path = os.path.join(td, "env_solar.rad")
-        with open(_env_path, "w") as wtr:
-            for prim in all_prims:
-                wtr.write(str(prim))
-        outsolar = dirname / ("_solar_{out.stem}.dat")
-
+    dirname = out.parent
     klems = True
     if wrap and (model.rbasis.startswith("sc")) and (model.sbasis.startswith("sc")):
         klems = False
@@ -302,9 +476,37 @@ def gen_ncp_mtx(
             opt += " -hd -ff"
         else:
             opt = "-hd -ff"
+    # One scratch directory shared by the solar and the main stages
     with tf.TemporaryDirectory() as td:
+        if solar and ncp_type == "BSDF":
+            logger.info("Computing for solar and visible spectrum...")
+            xmlpath = ncp_mat.str_arg.split()[2]
+            with open(xmlpath) as rdr:
+                raw = rdr.read()
+            raw = WAVELENGTH_TAG.sub(lambda mat: WAVELENGTH_SWAP[mat.group(1)], raw)
+            solar_xml_path = Path(td, "solar.xml")
+            with open(solar_xml_path, "w") as wtr:
+                wtr.write(raw)
+            _strarg = ncp_mat.str_arg.split()
+            _strarg[2] = str(solar_xml_path)
+            solar_ncp_mat = Primitive(
+                ncp_mat.modifier,
+                ncp_mat.ptype,
+                ncp_mat.identifier + ".solar",
+                " ".join(_strarg),
+                "0",
+            )
+
+            _env_path = Path(td, "env_solar.rad")
+            with open(_env_path, "w") as wtr:
+                for path in model.env:
+                    for prim in utils.unpack_primitives(path):
+                        wtr.write(str(prim))
+            outsolar = dirname / f"_solar_{out.stem}.dat"
+
         src_dict = {}
         fwrap_dict = {}
+        mtxs: List[Path] = []
         for idx, _ in enumerate(model.windows):
             _tf = f"tf{idx}"
             _rf = f"rf{idx}"
@@ -321,9 +523,7 @@ def gen_ncp_mtx(
                 if forw:
                     src_dict[_rf] = Path(td, _rf + ".dat")
                     fwrap_dict[_rf] = Path(td, _rf + "p.dat")
-        ncp_compute_back(model, src_dict, opt, refl=refl)
-        if forw:
-            ncp_compute_front(model, src_dict, opt, refl=refl)
+        ncp_compute(model, src_dict, opt, refl=refl, forw=forw)
         if wrap:
             if klems:
                 klems_wrap(model, src_dict, fwrap_dict, out)
@@ -333,37 +533,33 @@ def gen_ncp_mtx(
             for key, file in src_dict.items():
                 out_name = f"{out.stem}_{key}.mtx"
                 file.rename(out.parent / out_name)
-
-    if solar and ncp_type == "BSDF":
-        # process_thread.join()
-        vis_dict = {}
-        sol_dict = {}
-        oname = Path(args["o"]).stem
-        mtxs = [
-            os.path.join(dirname, mtx)
-            for mtx in os.listdir(dirname)
-            if mtx.endswith(".mtx")
-        ]
-        for mtx in mtxs:
-            _direc = Path(mtx).stem.split("_")[-1][:2]
-            mtxname = Path(mtx).stem
-            if mtxname.startswith(oname):
-                # vis_dict[_direc] = os.path.join(dirname, f"_vis_{_direc}")
-                vis_dict[_direc] = os.path.join(td, f"vis_{_direc}")
-                out2 = os.path.join(dirname, f"vis_{_direc}")
-                klems_wrap(vis_dict[_direc], out2, mtx, args.ss)
-            if mtxname.startswith("_solar_"):
-                sol_dict[_direc] = os.path.join(td, f"sol_{_direc}")
-                out2 = os.path.join(dirname, f"sol_{_direc}")
-                klems_wrap(sol_dict[_direc], out2, mtx, args.ss)
-        cmd = f"wrapBSDF -a {args.ss} -c -s Visible "
-        cmd += " ".join([f"-{key} {vis_dict[key]}" for key in vis_dict])
-        cmd += " -s Solar "
-        cmd += " ".join([f"-{key} {sol_dict[key]}" for key in sol_dict])
-        cmd += f" > {os.path.join(dirname, oname)}.xml"
-        os.system(cmd)
-        shutil.rmtree(td)
-        [os.remove(mtx) for mtx in mtxs]
+                mtxs.append(out.parent / out_name)
+
+        if solar and ncp_type == "BSDF":
+            # process_thread.join()
+            vis_dict = {}
+            sol_dict = {}
+            oname = out.stem
+            for mtx in mtxs:
+                mtxname = mtx.stem
+                _direc = mtxname.split("_")[-1][:2]
+                if mtxname.startswith(oname):
+                    vis_dict[_direc] = Path(td, f"vis_{_direc}")
+                    klems_wrap2(vis_dict[_direc], mtx, model.sbasis)
+                if mtxname.startswith("_solar_"):
+                    sol_dict[_direc] = Path(td, f"sol_{_direc}")
+                    klems_wrap2(sol_dict[_direc], mtx, model.sbasis)
+            cmd = ["wrapBSDF", "-a", model.sbasis, "-c", "-s", "Visible"]
+            for key, path in vis_dict.items():
+                cmd.extend([f"-{key}", str(path)])
+            cmd.extend(["-s", "Solar"])
+            for key, path in sol_dict.items():
+                cmd.extend([f"-{key}", str(path)])
+            with open(f"{dirname / oname}.xml", "wb") as wtr:
+                sp.run(cmd, check=True, stdout=wtr)
+            # Only the matrices written above
+            for mtx in mtxs:
+                os.remove(mtx)
 
 
 # class Genfmtx(object):
@@ -584,7 +780,7 @@ def gen_port_prims_from_window_ncp(
     port_prims = []
     for idx, plg in enumerate(all_ports):
         new_prim = utils.polygon2prim(plg, "port", f"portf{idx+1}")
-        logger.debug(str(new_prim))
+        logger.debug("%s", new_prim)
         port_prims.append(new_prim)
     return port_prims
 
@@ -605,13 +801,13 @@ def gen_port_prims_from_window(
     port_prims = []
     for idx, plg in enumerate(all_ports):
         new_prim = utils.polygon2prim(plg, "port", f"portf{idx+1}")
-        logger.debug(str(new_prim))
+        logger.debug("%s", new_prim)
         port_prims.append(new_prim)
     return port_prims
 
 
 def gen_ports_from_window_ncp(
-    wp: geom.Polygon, np: Sequence[geom.Polygon]
+    wp: geom.Polygon, ncps: Sequence[geom.Polygon]
 ) -> List[geom.Polygon]:
     """
     Generate ports polygons that encapsulate the window and NCP geometries.
@@ -624,35 +820,19 @@ def gen_ports_from_window_ncp(
     """
     wn = wp.normal()
     if (abs(wn.y) == 1) or (abs(wn.x) == 1):
-        np.append(wp)
-        bbox = geom.getbbox(np, offset=0.00)
-        bbox.remove([b for b in bbox if b.normal().reverse() == wn][0])
+        bbox = geom.getbbox([*ncps, wp], offset=0.00)
+        del bbox[BBOX_FACE_INDEX[tuple(round(i) for i in wn.to_list())]]
         return [b.move(wn.scale(-0.1)) for b in bbox]
-    xax = [1, 0, 0]
-    _xax = [-1, 0, 0]
-    yax = [0, 1, 0]
-    _yax = [0, -1, 0]
     zaxis = geom.Vector(0, 0, 1)
-    rm_pg = [xax, _yax, _xax, yax]
-    area_list = []
-    win_normals = []
     # Find axiel aligned rotation angle
-    bboxes = []
-    for deg in range(90):
-        rad = math.radians(deg)
-        win_polygon_r = wp.rotate(zaxis, rad)
-        win_normals.append(win_polygon_r.normal())
-        ncs_polygon_r = [p.rotate(zaxis, rad) for p in np]
-        ncs_polygon_r.append(win_polygon_r)
-        _bbox = geom.getbbox(ncs_polygon_r, offset=0.001)
-        bboxes.append(_bbox)
-        area_list.append(_bbox[0].area())
+    rrad = geom.min_bbox_rotation([v for p in (wp, *ncps) for v in p.vertices])
     # Rotate to position
-    deg = area_list.index(min(area_list))
-    rrad = math.radians(deg)
-    bbox = bboxes[deg]
-    _win_normal = [round(i, 1) for i in win_normals[deg].to_list()]
-    del bbox[rm_pg.index(_win_normal) + 2]
+    win_polygon_r = wp.rotate(zaxis, rrad)
+    ncs_polygon_r = [p.rotate(zaxis, rrad) for p in ncps]
+    ncs_polygon_r.append(win_polygon_r)
+    bbox = geom.getbbox(ncs_polygon_r, offset=0.001)
+    _win_normal = tuple(round(i, 1) for i in win_polygon_r.normal().to_list())
+    del bbox[BBOX_FACE_INDEX[_win_normal]]
     rotate_back = [pg.rotate(zaxis, rrad * -1) for pg in bbox]
     return rotate_back
 
@@ -660,11 +840,11 @@ def gen_ports_from_window_ncp(
 def merge_windows(prims: Sequence[Primitive]) -> Primitive:
     """Merge rectangles if coplanar."""
     polygons = [parsers.parse_polygon(p.real_arg) for p in prims]
-    normals = [p.normal() for p in polygons]
-    if len(set(normals)) > 1:
+    normal = polygons[0].normal()
+    if any(p.normal().distance_from(normal) > 1e-6 for p in polygons[1:]):
         raise ValueError("Windows not co-planar")
     points = [i for p in polygons for i in p.vertices]
-    hull_polygon = geom.convexhull(points, normals[0])
+    hull_polygon = geom.convexhull(points, normal)
     modifier = prims[0].modifier
     identifier = prims[0].identifier
     new_prim = utils.polygon2prim(hull_polygon, modifier, identifier)
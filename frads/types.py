@@ -7,10 +7,12 @@ The exceptions are the Vector and Polygon class in the geom.py module.
 from dataclasses import dataclass
 from dataclasses import field
 from pathlib import Path
+from typing import Callable
 from typing import Dict
 from typing import List
 from typing import NamedTuple
 from typing import Optional
+from typing import Tuple
 from typing import Union
 
 from frads.geom import Polygon
@@ -51,13 +53,15 @@ class Sender:
 
     Attributes:
         form(str): types of sender, {surface(s)|view(v)|points(p)}
-        sender(str): the sender object
+        sender(str): the sender object, or for a view, either the rays
+            as bytes or the stages that generate the rays, commands or
+            callables taking the input and output streams
         xres(int): sender x dimension
         yres(int): sender y dimension
     """
 
     form: str
-    sender: Union[str, bytes]
+    sender: Union[str, bytes, Tuple[Union[Tuple[str, ...], Callable], ...]]
     xres: Optional[int]
     yres: Optional[int]
 
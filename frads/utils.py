@@ -1,6 +1,7 @@
 """
 This module contains all utility functions used throughout frads.
 """
+from functools import lru_cache
 from io import TextIOWrapper
 import logging
 import math
@@ -455,16 +456,20 @@ def lambda_calc(theta_lr, theta_up, nphi):
     )
 
 
-def angle_basis_coeff(basis: str) -> List[float]:
-    """Calculate klems basis coefficient"""
+@lru_cache(maxsize=None)
+def angle_basis_coeff(basis: str) -> Tuple[float, ...]:
+    """Calculate klems basis coefficient.
+
+    The result is cached per basis, hence returned as a tuple.
+    """
     ablist = ABASE_LIST[basis]
-    lambdas = []
+    lambdas: List[float] = []
     for i in range(len(ablist) - 1):
         tu = ablist[i + 1][0]
         tl = ablist[i][0]
         np = ablist[i][1]
         lambdas.extend([lambda_calc(tl, tu, np) for _ in range(np)])
-    return lambdas
+    return tuple(lambdas)
 
 
 def opt2str(opt: dict) -> str:
@@ -0,0 +1,51 @@
+import math
+import unittest
+
+from frads import geom
+
+
+class TestGeom(unittest.TestCase):
+
+    zaxis = geom.Vector(0, 0, 1)
+    rectangle = geom.Polygon(
+        [
+            geom.Vector(0, 0, 0),
+            geom.Vector(4, 0, 0),
+            geom.Vector(4, 1, 0),
+            geom.Vector(0, 1, 0),
+        ]
+    )
+
+    def assert_axis_aligned(self, polygon):
+        """Every edge is parallel to either the X or the Y axis."""
+        vertices = polygon.vertices
+        for pt1, pt2 in zip(vertices, vertices[1:] + vertices[:1]):
+            self.assertAlmostEqual(
+                min(abs(pt2.x - pt1.x), abs(pt2.y - pt1.y)), 0, places=6
+            )
+
+    def test_min_bbox_rotation(self):
+        for deg in (0, 10, 30, 45, 60, 89, 120, 200, 315):
+            rad = math.radians(deg)
+            rotated = self.rectangle.rotate(self.zaxis, rad)
+            rrad = geom.min_bbox_rotation(rotated.vertices)
+            self.assertGreaterEqual(rrad, 0)
+            self.assertLess(rrad, math.pi / 2)
+            aligned = rotated.rotate(self.zaxis, rrad)
+            self.assert_axis_aligned(aligned)
+            xmin, xmax, ymin, ymax, _, _ = aligned.extreme()
+            area = (xmax - xmin) * (ymax - ymin)
+            self.assertAlmostEqual(area, 4, places=6)
+
+    def test_min_bbox_rotation_points(self):
+        """Interior and off-plane points don't change the result."""
+        rotated = self.rectangle.rotate(self.zaxis, math.radians(25))
+        diagonal = rotated.vertices[2] - rotated.vertices[0]
+        center = rotated.vertices[0] + diagonal.scale(0.5)
+        points = [*rotated.vertices, center + geom.Vector(0, 0, 3)]
+        rrad = geom.min_bbox_rotation(points)
+        self.assert_axis_aligned(rotated.rotate(self.zaxis, rrad))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,230 @@
+import math
+import os
+from functools import partial
+import random
+import subprocess as sp
+import sys
+import tempfile as tf
+import unittest
+
+from frads import geom
+from frads import matrix
+from frads import utils
+from frads.types import Receiver
+from frads.types import Sender
+
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    pass
+
+
+@unittest.skipUnless(matrix.NUMPY_FOUND, "requires numpy")
+class TestMatrix(unittest.TestCase):
+
+    # Portable stand-ins for cat reading a file and reading stdin
+    cat_file = (
+        "import shutil, sys; "
+        "shutil.copyfileobj(open(sys.argv[1], 'rb'), sys.stdout.buffer)"
+    )
+    cat_stdin = (
+        "import shutil, sys; shutil.copyfileobj(sys.stdin.buffer, sys.stdout.buffer)"
+    )
+
+    def test_apply_circle_mask(self):
+        """Compare with the rcalc expressions in utils.flush_corner_rays_cmd."""
+        # More rays than a single read chunk, to carry the record number over
+        xres, ray_cnt = 200, 2
+        nrays = xres * xres * ray_cnt
+        rays = np.random.default_rng(0).random((nrays, 6), dtype=np.float32) + 0.5
+        with tf.TemporaryDirectory() as tempd:
+            ray_path = os.path.join(tempd, "rays")
+            with open(ray_path, "wb") as wtr:
+                wtr.write(rays.tobytes())
+            sender = Sender(
+                "v",
+                (
+                    (sys.executable, "-c", self.cat_file, ray_path),
+                    partial(matrix.apply_circle_mask, xres=xres, ray_cnt=ray_cnt),
+                ),
+                xres,
+                xres,
+            )
+            with matrix.view_rays(sender) as stream:
+                proc = sp.run(
+                    [sys.executable, "-c", self.cat_stdin], stdin=stream, stdout=sp.PIPE
+                )
+        result = np.frombuffer(proc.stdout, dtype=np.float32).reshape(-1, 6)
+        self.assertEqual(result.shape, rays.shape)
+        np.testing.assert_array_equal(result[:, :3], rays[:, :3])
+        incir = []
+        for recno in range(1, nrays + 1):
+            pn = (recno - 1) / ray_cnt + 0.5
+            xpos = pn / xres - math.floor(pn / xres)
+            ypos = pn / (xres * xres)
+            incir.append(1 if 0.25 - (xpos - 0.5) ** 2 - (ypos - 0.5) ** 2 > 0 else 0)
+        expected = rays[:, 3:] * np.array(incir, dtype=np.float32)[:, None]
+        np.testing.assert_array_equal(result[:, 3:], expected)
+        # This ray lands exactly on the circle, where rcalc's if() gives 0
+        boundary = ray_cnt * (xres * xres // 2) - ray_cnt // 2
+        self.assertEqual(incir[boundary], 0)
+        # Roughly the corners outside the inscribed circle, 1 - pi / 4
+        self.assertAlmostEqual(1 - sum(incir) / nrays, 1 - math.pi / 4, places=2)
+
+    def test_view_rays_bytes(self):
+        """Rays given as bytes are streamed as they are."""
+        rays = np.arange(60, dtype=np.float32).tobytes()
+        with matrix.view_rays(Sender("v", rays, 2, 5)) as stream:
+            proc = sp.run(
+                [sys.executable, "-c", self.cat_stdin], stdin=stream, stdout=sp.PIPE
+            )
+        self.assertEqual(proc.stdout, rays)
+
+    def test_offset_polygons(self):
+        """The numpy path matches the geom fallback on mixed vertex counts."""
+        vec = geom.Vector
+        polygons = [
+            geom.Polygon([vec(0, 0, 0), vec(1, 0, 0), vec(1, 0, 1), vec(0, 0, 1)]),
+            geom.Polygon([vec(0, 0, 0), vec(1, 1, 0), vec(1, 1, 1.5)]),
+            geom.Polygon(
+                [
+                    vec(3, 0, 0),
+                    vec(4, 0.3, 0),
+                    vec(4.2, 0.36, 0.5),
+                    vec(4, 0.3, 1),
+                    vec(3, 0, 1),
+                ]
+            ),
+            geom.Polygon([vec(0, 0, 3), vec(0, 2, 3), vec(2, 2, 3), vec(2, 0, 3)]),
+        ]
+        prims = [
+            utils.polygon2prim(poly, "glass", f"window{idx}")
+            for idx, poly in enumerate(polygons)
+        ]
+        real_args = [prim.real_arg for prim in prims]
+        results = {}
+        surfaces = {}
+        try:
+            for numpy_found in (True, False):
+                matrix.NUMPY_FOUND = numpy_found
+                results[numpy_found] = matrix.offset_polygons(real_args, 0.1)
+                # prepare_surface tags the source modifier with random characters
+                random.seed(0)
+                surfaces[numpy_found] = matrix.prepare_surface(
+                    prims=prims,
+                    basis="kf",
+                    left=False,
+                    offset=0.1,
+                    source="glow",
+                    out=None,
+                )
+        finally:
+            matrix.NUMPY_FOUND = True
+        self.assertEqual(results[True], results[False])
+        self.assertEqual(surfaces[True], surfaces[False])
+        # Clockwise seen from above, so the normal points down
+        self.assertEqual(
+            results[True][3],
+            "12 0.000000 0.000000 2.900000 0.000000 2.000000 2.900000 "
+            "2.000000 2.000000 2.900000 2.000000 0.000000 2.900000",
+        )
+
+
+class TestOctCache(unittest.TestCase):
+
+    receiver = Receiver("void glow rflx 0 0 4 1 1 1 0\n", "kf", "rflx")
+
+    def setUp(self):
+        self.tempd = tf.TemporaryDirectory()
+        self.addCleanup(self.tempd.cleanup)
+        self.addCleanup(setattr, matrix, "run_oconv", matrix.run_oconv)
+        self.environ = dict(os.environ)
+        self.addCleanup(os.environ.update, self.environ)
+        self.addCleanup(os.environ.clear)
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.tempd.name, "cache")
+        os.environ.pop("FRADS_OCT_CACHE", None)
+
+    def write(self, name, content):
+        path = os.path.join(self.tempd.name, name)
+        with open(path, "w") as wtr:
+            wtr.write(content)
+        return path
+
+    def cache_files(self):
+        return sorted(os.listdir(matrix.oct_cache_dir()))
+
+    def test_oct_cache_key(self):
+        plain = self.write("plain.rad", "void plastic mat 0 0 5 .5 .5 .5 0 0\n")
+        key = matrix.oct_cache_key(self.receiver, [plain])
+        self.assertIsInstance(key, str)
+        self.assertEqual(key, matrix.oct_cache_key(self.receiver, [plain]))
+        other = Receiver("void glow rflx 0 0 4 2 2 2 0\n", "kf", "rflx")
+        self.assertNotEqual(key, matrix.oct_cache_key(other, [plain]))
+        for content in (
+            "!xform -t 0 0 1 other.rad\n",
+            "  !genbox mat box 1 1 1\n",
+            "void instance furniture 1 chair.oct 0 0\n",
+            "mat mesh couch 1 couch.rtm 0 0\n",
+        ):
+            path = self.write("external.rad", content)
+            self.assertIsNone(matrix.oct_cache_key(self.receiver, [plain, path]))
+        missing = os.path.join(self.tempd.name, "missing.rad")
+        self.assertIsNone(matrix.oct_cache_key(self.receiver, [missing]))
+
+    def test_evict_oct_cache(self):
+        cache_dir = matrix.oct_cache_dir()
+        # Oldest first
+        for age, name in enumerate(("c.oct", "a.oct", "b.oct", "d.oct")):
+            path = cache_dir / name
+            path.write_bytes(b"0" * 100)
+            os.utime(path, (1000 + age, 1000 + age))
+        (cache_dir / "e.tmp").write_bytes(b"0" * 1000)
+        matrix.evict_oct_cache(cache_dir, 250)
+        self.assertEqual(self.cache_files(), ["b.oct", "d.oct", "e.tmp"])
+        matrix.evict_oct_cache(cache_dir, 200)
+        self.assertEqual(self.cache_files(), ["b.oct", "d.oct", "e.tmp"])
+        # A hit refreshes the entry
+        os.utime(cache_dir / "b.oct")
+        matrix.evict_oct_cache(cache_dir, 100)
+        self.assertEqual(self.cache_files(), ["b.oct", "e.tmp"])
+
+    def test_rcvr_oct(self):
+        calls = []
+
+        def run_oconv(receiver, env, oct_path):
+            calls.append(oct_path)
+            with open(oct_path, "wb") as wtr:
+                wtr.write(b"octree")
+
+        matrix.run_oconv = run_oconv
+        env = [self.write("plain.rad", "void plastic mat 0 0 5 .5 .5 .5 0 0\n")]
+        for name in ("first.oct", "second.oct"):
+            oct_path = os.path.join(self.tempd.name, name)
+            matrix.rcvr_oct(self.receiver, env, oct_path)
+            with open(oct_path, "rb") as rdr:
+                self.assertEqual(rdr.read(), b"octree")
+        self.assertEqual(len(calls), 1)
+        key = matrix.oct_cache_key(self.receiver, env)
+        self.assertEqual(self.cache_files(), [f"{key}.oct"])
+        # Opting out goes straight to oconv
+        os.environ["FRADS_OCT_CACHE"] = "0"
+        matrix.rcvr_oct(self.receiver, env, oct_path)
+        self.assertEqual(calls[-1], oct_path)
+        self.assertEqual(len(calls), 2)
+
+    def test_rcvr_oct_failure(self):
+        def run_oconv(receiver, env, oct_path):
+            with open(oct_path, "wb") as wtr:
+                wtr.write(b"partial")
+            raise KeyboardInterrupt
+
+        matrix.run_oconv = run_oconv
+        env = [self.write("plain.rad", "void plastic mat 0 0 5 .5 .5 .5 0 0\n")]
+        oct_path = os.path.join(self.tempd.name, "out.oct")
+        with self.assertRaises(KeyboardInterrupt):
+            matrix.rcvr_oct(self.receiver, env, oct_path)
+        self.assertEqual(self.cache_files(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
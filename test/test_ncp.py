@@ -0,0 +1,125 @@
+import math
+import os
+import tempfile as tf
+from types import SimpleNamespace
+import unittest
+
+from frads import ncp
+from frads import utils
+
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    pass
+
+
+def write_ascii_mtx(path, rgb):
+    """Write a (nrows, ncols, 3) array as a Radiance ascii matrix file."""
+    nrows, ncols, _ = rgb.shape
+    with open(path, "w") as wtr:
+        wtr.write(f"#?RADIANCE\nNROWS={nrows}\nNCOLS={ncols}\nNCOMP=3\n")
+        wtr.write("FORMAT=ascii\n\n")
+        for row in rgb:
+            wtr.write("\t".join(" ".join(f"{val:.7g}" for val in col) for col in row))
+            wtr.write("\n")
+
+
+def rcalc_cie(red, grn, blu):
+    """The CIE expressions rttree_reduce used to run through rcalc."""
+    xval = 0.5141 * red + 0.3239 * grn + 0.1620 * blu
+    yval = 0.2651 * red + 0.6701 * grn + 0.0648 * blu
+    zval = 0.0241 * red + 0.1229 * grn + 0.8530 * blu
+    den = xval + 15 * yval + 3 * zval
+    # rcalc if(a, b, c) takes b only when a is positive
+    uprime = 4 * xval / den if yval > 0 else 4 / 19
+    vprime = 9 * yval / den if yval > 0 else 9 / 19
+    return yval, uprime, vprime
+
+
+@unittest.skipUnless(ncp.NUMPY_FOUND, "requires numpy")
+class TestNcp(unittest.TestCase):
+
+    rgb = [
+        [1, 1, 1],
+        [1, 0, 0],
+        [0, 1, 0],
+        [0, 0, 1],
+        [0.2, 0.5, 0.1],
+        [0, 0, 0],
+        [-0.1, -0.2, -0.1],
+    ]
+    ns2 = 16
+
+    def transform(self, spec):
+        return ncp.cie_transform(np.array(self.rgb, dtype=float), spec, self.ns2)
+
+    def test_cie_transform_visible(self):
+        result = self.transform("Visible")
+        self.assertEqual(result.dtype, np.float32)
+        self.assertAlmostEqual(result[0], 1 / (math.pi / self.ns2), places=5)
+        for res, rgb in zip(result, self.rgb):
+            yval, _, _ = rcalc_cie(*rgb)
+            self.assertAlmostEqual(res, yval / (math.pi / self.ns2), places=5)
+
+    def test_cie_transform_u(self):
+        result = self.transform("CIE-u")
+        self.assertAlmostEqual(result[0], 4 / 19, places=6)
+        self.assertAlmostEqual(result[1], 4 * 0.5141 / 4.5629, places=6)
+        for res, rgb in zip(result, self.rgb):
+            self.assertAlmostEqual(res, rcalc_cie(*rgb)[1], places=6)
+        # Y <= 0 takes the default
+        self.assertAlmostEqual(result[5], 4 / 19, places=6)
+        self.assertAlmostEqual(result[6], 4 / 19, places=6)
+
+    def test_cie_transform_v(self):
+        result = self.transform("CIE-v")
+        self.assertAlmostEqual(result[0], 9 / 19, places=6)
+        self.assertAlmostEqual(result[1], 9 * 0.2651 / 4.5629, places=6)
+        for res, rgb in zip(result, self.rgb):
+            self.assertAlmostEqual(res, rcalc_cie(*rgb)[2], places=6)
+        self.assertAlmostEqual(result[5], 9 / 19, places=6)
+        self.assertAlmostEqual(result[6], 9 / 19, places=6)
+
+    def test_cie_transform_unknown(self):
+        with self.assertRaises(ValueError):
+            self.transform("Solar")
+
+    def test_klems_wrap2(self):
+        """Luminance of the transposed matrix, divided by the basis coefficients."""
+        # Non-square, so a missed transpose doesn't go unnoticed
+        rgb = np.random.default_rng(0).random((7, 145, 3))
+        coeff = np.array(utils.angle_basis_coeff(ncp.KLEMS_BASIS["kf"]))
+        expected = (rgb @ ncp.LUM_WEIGHTS).T / coeff[:, None]
+        with tf.TemporaryDirectory() as tempd:
+            inp = os.path.join(tempd, "in.mtx")
+            out = os.path.join(tempd, "out.dat")
+            write_ascii_mtx(inp, rgb)
+            ncp.klems_wrap2(out, inp, "kf")
+            result = np.loadtxt(out)
+        self.assertEqual(result.shape, (145, 7))
+        np.testing.assert_allclose(result, expected, rtol=1e-6)
+
+    def test_klems_wrap(self):
+        """klems_wrap writes the transposed luminance, unscaled, before wrapping."""
+        rgb = np.random.default_rng(1).random((5, 3, 3))
+        expected = (rgb @ ncp.LUM_WEIGHTS).T
+        wrapped = []
+        wrap_windows = ncp.wrap_windows
+        ncp.wrap_windows = lambda *args: wrapped.append(args)
+        try:
+            with tf.TemporaryDirectory() as tempd:
+                src_dict = {"tb0": os.path.join(tempd, "tb0.dat")}
+                fwrap_dict = {"tb0": os.path.join(tempd, "tb0p.dat")}
+                write_ascii_mtx(src_dict["tb0"], rgb)
+                model = SimpleNamespace(rbasis="kf")
+                ncp.klems_wrap(model, src_dict, fwrap_dict, "out")
+                result = np.loadtxt(fwrap_dict["tb0"])
+        finally:
+            ncp.wrap_windows = wrap_windows
+        self.assertEqual(wrapped, [(model, fwrap_dict, "out", ["-a", "kf", "-c"])])
+        self.assertEqual(result.shape, (3, 5))
+        np.testing.assert_allclose(result, expected, rtol=1e-6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import math
 import os
 from pathlib import Path
 import unittest
@@ -86,7 +87,10 @@ class TestUtils(unittest.TestCase):
         pass
 
     def test_angle_basis_coeff(self):
-        pass
+        coeff = utils.angle_basis_coeff("Klems Full")
+        self.assertEqual(len(coeff), 145)
+        self.assertAlmostEqual(sum(coeff), math.pi, places=6)
+        self.assertIs(utils.angle_basis_coeff("Klems Full"), coeff)
 
     def test_opt2str(self):
         pass